@@ -4,34 +4,111 @@ Main Flask Application
 """
 
 import os
+import re
+import atexit
 import sys
+import hashlib
 import logging
+import importlib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from flask import (
-    Flask, render_template, request, jsonify,
-    send_from_directory, abort
+    Flask, Response, render_template, request, jsonify,
+    make_response, send_from_directory, abort
 )
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
+import msgspec
+import orjson
+from zipstream import ZipStream
 
 # Load environment variables
 load_dotenv()
 
 # ── App Initialization ────────────────────────────────────────────────────────
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider that serializes responses with orjson.
+
+    Dates and datetimes are passed through to Flask's default handler so they
+    stay HTTP-date strings. Unlike Flask, non-ASCII text is written as raw
+    UTF-8 rather than \\u escapes; both decode to the same value.
+    """
+
+    _options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # orjson emits bytes; hand them to the response without re-encoding
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self._options),
+            mimetype=self.mimetype,
+        )
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "gyanguru-dev-secret-2024")
 app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_CONTENT_LENGTH", 16 * 1024 * 1024))
+# Behind Apache (mod_xsendfile) or lighttpd, let the server sendfile() downloads
+# straight from disk. Flask only emits X-Sendfile, which nginx ignores, so
+# leave this off behind nginx or downloads come back empty.
+app.config["USE_X_SENDFILE"] = os.getenv("USE_X_SENDFILE", "False").lower() == "true"
+
+# Flask reads FLASK_DEBUG (true/1/...) into app.debug, and with
+# TEMPLATES_AUTO_RELOAD unset Jinja only stats templates in debug. Outside
+# debug, also keep every parsed template instead of an LRU of 400.
+if not app.debug:
+    app.jinja_options = {**app.jinja_options, "cache_size": -1}
 
 GENERATED_FOLDER = os.getenv("GENERATED_FOLDER", "generated")
 AUDIO_DIR = os.path.join(GENERATED_FOLDER, "audio")
 IMAGE_DIR = os.path.join(GENERATED_FOLDER, "images")
 CODE_DIR  = os.path.join(GENERATED_FOLDER, "code")
+DOWNLOAD_MAX_AGE = int(os.getenv("DOWNLOAD_MAX_AGE", 300))
 
 for d in [AUDIO_DIR, IMAGE_DIR, CODE_DIR]:
     Path(d).mkdir(parents=True, exist_ok=True)
 
+# ── Background Executors ─────────────────────────────────────────────────────
+# Long-running generations requested with "background": true
+_job_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("JOB_WORKERS", 8)),
+    thread_name_prefix="job"
+)
+JOB_TTL = int(os.getenv("JOB_TTL", 3600))
+# Queued + running jobs allowed per process; each one is a paid upstream call
+# (an image job fans out further), so refuse new work beyond this
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", 32))
+# Jobs still running this long after they started are reported as failed
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", 900))
+_job_slots = threading.BoundedSemaphore(JOB_MAX_QUEUED)
+_jobs = None
+_jobs_lock = threading.Lock()
+
+# Single worker so housekeeping jobs never run concurrently with each other
+_maintenance_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="maintenance")
+
+for _pool in (_job_pool, _maintenance_pool):
+    atexit.register(_pool.shutdown, wait=False)
+
 # ── Logging ───────────────────────────────────────────────────────────────────
 logging.basicConfig(
     level=logging.INFO,
@@ -40,16 +117,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ── Import utility modules ────────────────────────────────────────────────────
-from utils.genai_utils import (
-    generate_text_explanation,
-    generate_code_example,
-    generate_audio_script,
-    generate_image_prompts
-)
-from utils.audio_utils import generate_audio, cleanup_old_audio
-from utils.image_utils import generate_educational_images
-from utils.code_executor import save_code_file, get_colab_instructions, get_local_instructions
+# ── Utility modules ──────────────────────────────────────────────────────────
+# The generators pull in heavy SDKs (google-generativeai, gTTS, Pillow); import
+# them on first use so workers that only serve pages/downloads start fast.
+def _lazy(module: str, name: str):
+    """Return a stand-in that imports `module.name` on first call."""
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+generate_text_explanation = _lazy("utils.genai_utils", "generate_text_explanation")
+generate_code_example = _lazy("utils.genai_utils", "generate_code_example")
+generate_audio_script = _lazy("utils.genai_utils", "generate_audio_script")
+generate_image_prompts = _lazy("utils.genai_utils", "generate_image_prompts")
+generate_audio = _lazy("utils.audio_utils", "generate_audio")
+cleanup_old_audio = _lazy("utils.audio_utils", "cleanup_old_audio")
+generate_educational_images = _lazy("utils.image_utils", "generate_educational_images")
+save_code_file = _lazy("utils.code_executor", "save_code_file")
+get_colab_instructions = _lazy("utils.code_executor", "get_colab_instructions")
+get_local_instructions = _lazy("utils.code_executor", "get_local_instructions")
+
+from utils.response_cache import cached
+
+# Identical requests return the same content; skip the LLM round-trip
+generate_text_explanation = cached("text")(generate_text_explanation)
+generate_code_example = cached("code")(generate_code_example)
+generate_audio_script = cached("audio_script")(generate_audio_script)
+generate_image_prompts = cached("image_prompts")(generate_image_prompts)
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -58,23 +154,52 @@ from utils.code_executor import save_code_file, get_colab_instructions, get_loca
 
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return _render_page("index.html")
 
 @app.route("/text")
 def text_page():
-    return render_template("text.html")
+    return _render_page("text.html")
 
 @app.route("/code")
 def code_page():
-    return render_template("code.html")
+    return _render_page("code.html")
 
 @app.route("/audio")
 def audio_page():
-    return render_template("audio.html")
+    return _render_page("audio.html")
 
 @app.route("/image")
 def image_page():
-    return render_template("image.html")
+    return _render_page("image.html")
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# REQUEST SCHEMAS
+# ══════════════════════════════════════════════════════════════════════════════
+
+class TextRequest(msgspec.Struct):
+    topic: str = ""
+    depth: str = "Comprehensive"
+
+class CodeRequest(msgspec.Struct):
+    algorithm: str = ""
+    complexity: str = "Detailed"
+
+class AudioRequest(msgspec.Struct):
+    topic: str = ""
+    length: str = "Medium"
+    background: bool = False
+
+class ImageRequest(msgspec.Struct):
+    concept: str = ""
+    backend: str = "gemini"
+    background: bool = False
+
+
+_TEXT_REQUEST = msgspec.json.Decoder(TextRequest)
+_CODE_REQUEST = msgspec.json.Decoder(CodeRequest)
+_AUDIO_REQUEST = msgspec.json.Decoder(AudioRequest)
+_IMAGE_REQUEST = msgspec.json.Decoder(ImageRequest)
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -84,9 +209,9 @@ def image_page():
 @app.route("/api/generate/text", methods=["POST"])
 def api_generate_text():
     """Generate structured ML concept explanation."""
-    data = request.get_json(silent=True) or {}
-    topic = data.get("topic", "").strip()
-    depth = data.get("depth", "Comprehensive")
+    req = _parse_body(_TEXT_REQUEST)
+    topic = req.topic.strip()
+    depth = req.depth
 
     if not topic:
         return jsonify({"status": "error", "message": "Topic is required"}), 400
@@ -99,9 +224,9 @@ def api_generate_text():
 @app.route("/api/generate/code", methods=["POST"])
 def api_generate_code():
     """Generate complete Python ML algorithm implementation."""
-    data = request.get_json(silent=True) or {}
-    algorithm = data.get("algorithm", "").strip()
-    complexity = data.get("complexity", "Detailed")
+    req = _parse_body(_CODE_REQUEST)
+    algorithm = req.algorithm.strip()
+    complexity = req.complexity
 
     if not algorithm:
         return jsonify({"status": "error", "message": "Algorithm name is required"}), 400
@@ -128,58 +253,51 @@ def api_generate_code():
 @app.route("/api/generate/audio", methods=["POST"])
 def api_generate_audio():
     """Generate educational audio lesson (script + MP3)."""
-    data = request.get_json(silent=True) or {}
-    topic = data.get("topic", "").strip()
-    length = data.get("length", "Medium")
+    req = _parse_body(_AUDIO_REQUEST)
+    topic = req.topic.strip()
+    length = req.length
 
     if not topic:
         return jsonify({"status": "error", "message": "Topic is required"}), 400
 
     logger.info(f"Generating audio: '{topic}' [{length}]")
+    if req.background:
+        return _submit_job(_generate_audio_lesson, topic, length)
 
-    # Step 1: Generate script
-    script_result = generate_audio_script(topic, length)
-    if script_result.get("status") != "success":
-        return jsonify(script_result), 500
-
-    script = script_result.get("script", "")
-
-    # Step 2: Convert to audio
-    audio_result = generate_audio(script, topic, AUDIO_DIR)
-    audio_result["script"] = script
-    audio_result["topic"] = topic
-
-    # Cleanup old files
-    cleanup_old_audio(AUDIO_DIR)
-
-    return jsonify(audio_result)
+    result, status = _generate_audio_lesson(topic, length)
+    return jsonify(result), status
 
 
 @app.route("/api/generate/image", methods=["POST"])
 def api_generate_image():
     """Generate educational ML concept diagrams."""
-    data = request.get_json(silent=True) or {}
-    concept = data.get("concept", "").strip()
-    backend = data.get("backend", "gemini")
+    req = _parse_body(_IMAGE_REQUEST)
+    concept = req.concept.strip()
+    backend = req.backend
 
     if not concept:
         return jsonify({"status": "error", "message": "Concept is required"}), 400
 
     logger.info(f"Generating images: '{concept}' [{backend}]")
+    if req.background:
+        return _submit_job(_generate_concept_images, concept, backend)
 
-    # Step 1: Get image prompts
-    prompt_result = generate_image_prompts(concept)
-    if prompt_result.get("status") != "success":
-        return jsonify(prompt_result), 500
+    result, status = _generate_concept_images(concept, backend)
+    return jsonify(result), status
 
-    prompts = prompt_result.get("prompts", [])
 
-    # Step 2: Generate images
-    image_result = generate_educational_images(prompts, concept, backend, IMAGE_DIR)
-    image_result["prompts"] = prompts
-    image_result["concept"] = concept
+@app.route("/api/jobs/<job_id>")
+def api_job_status(job_id):
+    """Report the status and, once finished, the result of a background job."""
+    job = _job_store().get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+
+    if job["status"] in ("queued", "running") and _job_is_stale(job):
+        return jsonify({"job_id": job_id, "status": "error",
+                        "message": "Job was lost before it finished; please retry"})
 
-    return jsonify(image_result)
+    return jsonify({"job_id": job_id, **{k: v for k, v in job.items() if k != "pid"}})
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -192,7 +310,7 @@ def download_audio(filename):
     safe = _safe_filename(filename)
     if not safe:
         abort(400)
-    return send_from_directory(AUDIO_DIR, safe, as_attachment=True)
+    return _send_generated(AUDIO_DIR, safe)
 
 
 @app.route("/download/code/<filename>")
@@ -201,7 +319,7 @@ def download_code(filename):
     safe = _safe_filename(filename)
     if not safe:
         abort(400)
-    return send_from_directory(CODE_DIR, safe, as_attachment=True)
+    return _send_generated(CODE_DIR, safe)
 
 
 @app.route("/download/image/<filename>")
@@ -210,7 +328,47 @@ def download_image(filename):
     safe = _safe_filename(filename)
     if not safe:
         abort(400)
-    return send_from_directory(IMAGE_DIR, safe, as_attachment=True)
+    return _send_generated(IMAGE_DIR, safe)
+
+
+@app.route("/download/bundle/<topic>")
+def download_bundle(topic):
+    """Stream a ZIP of all generated audio, code and images for a topic."""
+    safe = _safe_filename(topic)
+    if not safe:
+        abort(400)
+
+    # Generated files are named "<topic>.<ext>" or "<topic>_<suffix>.<ext>";
+    # match only that prefix so the route cannot be used to sweep up everything
+    prefixes = (f"{safe}.".lower(), f"{safe}_".lower())
+    zs = ZipStream(sized=True)
+    added = 0
+    for folder, directory in [("audio", AUDIO_DIR), ("code", CODE_DIR), ("images", IMAGE_DIR)]:
+        for path in sorted(Path(directory).iterdir()):
+            if not path.name.lower().startswith(prefixes):
+                continue
+            # Open now so background cleanup can't remove a file after its size
+            # is counted into Content-Length; skip files that are already gone
+            try:
+                fh = open(path, "rb")
+            except (FileNotFoundError, IsADirectoryError):
+                continue
+            size = os.fstat(fh.fileno()).st_size
+            zs.add(_iter_file(fh, size), f"{folder}/{path.name}", size=size)
+            added += 1
+
+    if not added:
+        abort(404)
+
+    # Archive is built chunk by chunk as the client reads it
+    return Response(
+        zs,
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={safe}_bundle.zip",
+            "Content-Length": str(len(zs)),
+        },
+    )
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -221,6 +379,10 @@ def download_image(filename):
 def not_found(e):
     return jsonify({"status": "error", "message": "Resource not found"}), 404
 
+@app.errorhandler(msgspec.DecodeError)
+def bad_request_body(e):
+    return jsonify({"status": "error", "message": f"Invalid request body: {e}"}), 400
+
 @app.errorhandler(500)
 def server_error(e):
     return jsonify({"status": "error", "message": "Internal server error"}), 500
@@ -230,23 +392,186 @@ def server_error(e):
 # HELPERS
 # ══════════════════════════════════════════════════════════════════════════════
 
+# Only alphanumeric, dash, underscore, dot
+_SAFE_FILENAME_RE = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
 def _safe_filename(filename: str) -> str:
     """Validate filename to prevent path traversal."""
-    from werkzeug.utils import secure_filename
     safe = secure_filename(filename)
-    # Ensure only alphanumeric, dash, underscore, dot
-    allowed_chars = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_.")
-    if not all(c in allowed_chars for c in safe):
-        return ""
-    return safe
+    return safe if _SAFE_FILENAME_RE.match(safe) else ""
+
+
+def _parse_body(decoder):
+    """Decode and validate the JSON request body; an empty body means defaults."""
+    return decoder.decode(request.get_data() or b"{}")
+
+
+def _iter_file(fh, size: int, chunk_size: int = 64 * 1024):
+    """Yield the first `size` bytes of an open file in chunks, then close it."""
+    # Stop at the size declared to the ZIP stream even if the file is still
+    # growing, so the archive matches its Content-Length
+    with fh:
+        remaining = size
+        while remaining > 0 and (chunk := fh.read(min(chunk_size, remaining))):
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _send_generated(directory: str, filename: str):
+    """Send a generated file with short-lived, revalidating cache headers."""
+    # Filenames may be reused when content is regenerated (e.g. "<algorithm>.py"),
+    # so only cache briefly; afterwards the stat-based ETag/Last-Modified turn
+    # repeat downloads into cheap 304s instead of full transfers.
+    return send_from_directory(directory, filename, as_attachment=True, max_age=DOWNLOAD_MAX_AGE)
+
+
+_page_cache = {}
+
+
+def _render_page(template: str):
+    """Render a context-free page once and serve it with an ETag."""
+    if app.debug:
+        return render_template(template)
+
+    cached_page = _page_cache.get(template)
+    if cached_page is None:
+        body = render_template(template)
+        cached_page = _page_cache[template] = (body, hashlib.sha1(body.encode("utf-8")).hexdigest())
+
+    body, etag = cached_page
+    resp = make_response(body)
+    resp.set_etag(etag)
+    return resp.make_conditional(request)
+
+
+_cleanup_future = None
+_cleanup_lock = threading.Lock()
+
+
+def _schedule_audio_cleanup() -> None:
+    """Queue an audio cleanup unless one is already pending or running."""
+    global _cleanup_future
+    with _cleanup_lock:
+        if _cleanup_future is not None and not _cleanup_future.done():
+            return
+        _cleanup_future = _maintenance_pool.submit(cleanup_old_audio, AUDIO_DIR)
+        _cleanup_future.add_done_callback(_log_task_error)
+
+
+def _log_task_error(future) -> None:
+    """Log exceptions raised by background tasks."""
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Background task failed", exc_info=exc)
+
+
+def _generate_audio_lesson(topic: str, length: str) -> tuple:
+    """Generate the audio script and its MP3. Returns (payload, http_status)."""
+    # Step 1: Generate script
+    script_result = generate_audio_script(topic, length)
+    if script_result.get("status") != "success":
+        return script_result, 500
+
+    script = script_result.get("script", "")
+
+    # Step 2: Convert to audio
+    audio_result = generate_audio(script, topic, AUDIO_DIR)
+    audio_result["script"] = script
+    audio_result["topic"] = topic
+
+    # Cleanup old files off the request path
+    _schedule_audio_cleanup()
+
+    return audio_result, 200
+
+
+def _generate_concept_images(concept: str, backend: str) -> tuple:
+    """Generate image prompts and their images. Returns (payload, http_status)."""
+    # Step 1: Get image prompts
+    prompt_result = generate_image_prompts(concept)
+    if prompt_result.get("status") != "success":
+        return prompt_result, 500
+
+    prompts = prompt_result.get("prompts", [])
+
+    # Step 2: Generate images
+    image_result = generate_educational_images(prompts, concept, backend, IMAGE_DIR)
+    image_result["prompts"] = prompts
+    image_result["concept"] = concept
+
+    return image_result, 200
+
+
+def _job_store():
+    """Open the on-disk job store on first use (shared by all workers)."""
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                from diskcache import Cache
+                _jobs = Cache(os.path.join(GENERATED_FOLDER, "jobs"))
+    return _jobs
+
+
+def _submit_job(func, *args):
+    """Queue func(*args) as a background job and return a 202 with its ID."""
+    if not _job_slots.acquire(blocking=False):
+        resp = jsonify({"status": "error", "message": "Too many background jobs, try again later"})
+        resp.headers["Retry-After"] = "30"
+        return resp, 503
+
+    job_id = uuid.uuid4().hex
+    job = {"status": "queued", "pid": os.getpid(), "queued_at": time.time()}
+    try:
+        _job_store().set(job_id, job, expire=JOB_TTL)
+        _job_pool.submit(_run_job, job_id, func, *args)
+    except Exception:
+        _job_slots.release()
+        raise
+    return jsonify({"status": "queued", "job_id": job_id}), 202
+
+
+def _run_job(job_id: str, func, *args) -> None:
+    jobs = _job_store()
+    try:
+        job = jobs.get(job_id) or {}
+        jobs.set(job_id, {**job, "status": "running", "started_at": time.time()}, expire=JOB_TTL)
+        try:
+            result, status = func(*args)
+            job = {"status": "done", "http_status": status, "result": result}
+        except Exception:
+            logger.exception(f"Background job {job_id} failed")
+            job = {"status": "error", "message": "Internal server error"}
+        jobs.set(job_id, job, expire=JOB_TTL)
+    finally:
+        _job_slots.release()
+
+
+def _job_is_stale(job: dict) -> bool:
+    """True if an unfinished job's worker is gone or it has run too long."""
+    # Age counts from started_at: a job waiting in a live worker's queue will
+    # still run, and reporting it lost would make the client pay for it twice
+    started_at = job.get("started_at")
+    if started_at is not None and time.time() - started_at > JOB_STALE_AFTER:
+        return True
+    # The pid check assumes every worker shares one host and pid namespace,
+    # which is the setup the local diskcache job store is meant for
+    try:
+        os.kill(job["pid"], 0)
+    except ProcessLookupError:
+        return True
+    except (KeyError, PermissionError):
+        pass
+    return False
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # ENTRY POINT
 # ══════════════════════════════════════════════════════════════════════════════
 
+# Development server only; in production run `gunicorn -c gunicorn.conf.py app:app`
 if __name__ == "__main__":
     port = int(os.getenv("FLASK_PORT", 5000))
-    debug = os.getenv("FLASK_DEBUG", "True").lower() == "true"
     logger.info(f"🚀 GyanGuru starting on http://localhost:{port}")
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    app.run(host="0.0.0.0", port=port)
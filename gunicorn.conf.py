@@ -0,0 +1,28 @@
+"""
+gunicorn.conf.py - Production server settings for GyanGuru
+
+Run with:  gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('FLASK_PORT', 5000)}"
+
+# Generate endpoints spend most of their time waiting on upstream APIs,
+# so use threaded workers to keep many requests in flight per process.
+workers = int(os.getenv("GUNICORN_WORKERS", max(2, (os.cpu_count() or 1) * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+# LLM, TTS and image generation calls can take a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+# Don't preload: app.py defers the SDK imports (google-generativeai, gTTS,
+# Pillow) to first use, so a preloaded master would share nothing and each
+# worker would still import them on its first generate request. Importing
+# them in the master instead would mean forking after gRPC/HTTP clients have
+# started, which those SDKs don't support. Workers start light and import once.
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
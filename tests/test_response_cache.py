@@ -0,0 +1,57 @@
+"""
+test_response_cache.py - Tests for utils.response_cache
+"""
+
+import pytest
+from diskcache import Cache
+
+from utils import response_cache
+from utils.response_cache import cached, make_key
+
+
+@pytest.fixture(autouse=True)
+def tmp_cache(tmp_path, monkeypatch):
+    cache = Cache(str(tmp_path / "cache"))
+    monkeypatch.setattr(response_cache, "_cache", cache)
+    yield cache
+    cache.close()
+
+
+def test_make_key_normalizes_case_and_whitespace():
+    assert make_key("text", "  Linear   Regression ", "Basic") == make_key("text", "linear regression", "basic")
+
+
+def test_make_key_separates_namespaces_and_args():
+    assert make_key("text", "knn") != make_key("code", "knn")
+    assert make_key("text", "knn", "Basic") != make_key("text", "knn", "Comprehensive")
+
+
+def test_only_success_results_are_cached():
+    calls = []
+
+    @cached("test")
+    def generate(topic):
+        calls.append(topic)
+        return {"status": "error" if len(calls) == 1 else "success", "text": topic}
+
+    assert generate("knn")["status"] == "error"
+    assert generate("knn")["status"] == "success"
+    assert generate("KNN")["status"] == "success"
+    assert calls == ["knn", "knn"]
+
+
+def test_cache_failure_falls_through_to_generator(monkeypatch):
+    class BrokenCache:
+        def get(self, key):
+            raise TimeoutError("database is locked")
+
+        def set(self, key, value, expire=None):
+            raise TimeoutError("database is locked")
+
+    monkeypatch.setattr(response_cache, "_cache", BrokenCache())
+
+    @cached("test")
+    def generate(topic):
+        return {"status": "success", "text": topic}
+
+    assert generate("knn") == {"status": "success", "text": "knn"}
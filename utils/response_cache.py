@@ -0,0 +1,72 @@
+"""
+response_cache.py - Persistent cache for GenAI generator responses
+"""
+
+import os
+import hashlib
+import functools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.getenv("GENERATED_FOLDER", "generated"), "cache")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache():
+    """Open the on-disk cache on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from diskcache import Cache
+                _cache = Cache(CACHE_DIR)
+    return _cache
+
+
+def _normalize(value) -> str:
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    return str(value)
+
+
+def make_key(namespace: str, *args) -> str:
+    """Build a cache key from the namespace and normalized arguments."""
+    raw = "|".join([namespace] + [_normalize(a) for a in args])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cached(namespace: str, ttl: int = 86400):
+    """
+    Cache successful results of a generator function.
+
+    Only results with status == "success" are stored, so transient API
+    errors are retried on the next request. Cache failures (lock timeouts,
+    sqlite errors) are logged and treated as a miss.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = make_key(namespace, *args)
+
+            try:
+                hit = _get_cache().get(key)
+            except Exception:
+                logger.warning(f"Cache read failed [{namespace}]", exc_info=True)
+                hit = None
+            if hit is not None:
+                logger.info(f"Cache hit [{namespace}]")
+                return hit
+
+            result = func(*args)
+            if isinstance(result, dict) and result.get("status") == "success":
+                try:
+                    _get_cache().set(key, result, expire=ttl)
+                except Exception:
+                    logger.warning(f"Cache write failed [{namespace}]", exc_info=True)
+            return result
+        return wrapper
+    return decorator